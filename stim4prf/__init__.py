@@ -3,9 +3,26 @@ import logging
 logging.basicConfig(level=logging.INFO, format="[stim4prf][%(levelname)s] %(message)s")
 logger = logging.getLogger("stim4prf")
 
-from .EyeLinkCoreGraphicsPsychoPy import EyeLinkCoreGraphicsPsychoPy
-from .eyetracking import EyeLinkTracker, MRCEyeTracking
 from .fixation import Fixation, FixationCross, FixationDot
 from .presenter import PRFStimulusPresenter
 from .reaction_time import analyze_reaction_times
 from .stimulus_loader import HDF5StimulusLoader, MatlabStimulusLoader, StimulusLoader
+
+# Eyetracking pulls in pylink (ctypes DLL loading) and the calibration
+# graphics; resolve those names lazily so `import stim4prf` stays cheap
+# when no eyetracker is used.
+_LAZY_IMPORTS = {
+    "EyeLinkTracker": "stim4prf.eyetracking",
+    "MRCEyeTracking": "stim4prf.eyetracking",
+    "EyeLinkCoreGraphicsPsychoPy": "stim4prf.EyeLinkCoreGraphicsPsychoPy",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
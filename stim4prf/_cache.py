@@ -0,0 +1,57 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from stim4prf import logger
+
+
+def scratch_path(path: str) -> str:
+    """Scratch-file name keyed on the absolute path and its mtime, so an
+    edited stimulus file invalidates its cache automatically."""
+    key = f"{os.path.abspath(path)}:{os.path.getmtime(path)}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"stim4prf_{digest}.npz")
+
+
+def get_or_build(path: str, builder):
+    """
+    Return the decoded (indexed_matrix, lut, frame_duration) for path from
+    the scratch cache, building and caching it on first use.
+    """
+    scratch = scratch_path(path)
+    if os.path.exists(scratch):
+        logger.info(f"Loading pre-decoded stimulus from cache: {scratch}")
+        try:
+            with np.load(scratch, allow_pickle=False) as data:
+                return (
+                    data["indexed_matrix"],
+                    data["lut"],
+                    float(data["frame_duration"]),
+                )
+        except Exception as e:
+            # a corrupt/truncated cache is a miss, not an error: rebuild
+            # and overwrite it below
+            logger.warning(f"Stimulus cache {scratch} unreadable ({e}); rebuilding.")
+
+    indexed_matrix, lut, frame_duration = builder()
+    # Write to a sibling temp file and move it into place atomically, so an
+    # interrupted save never leaves a half-written cache at the final path
+    # (the .npz suffix stays last so np.savez does not append another one)
+    tmp = scratch + ".tmp.npz"
+    try:
+        np.savez(
+            tmp,
+            indexed_matrix=indexed_matrix,
+            lut=lut,
+            frame_duration=frame_duration,
+        )
+        os.replace(tmp, scratch)
+    except OSError as e:
+        logger.warning(f"Could not write stimulus cache {scratch}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return indexed_matrix, lut, frame_duration
@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def lut_expand(indexed, lut, out):
+    """Fill out[y, x, c] = lut[indexed[y, x], c] without a temporary."""
+    np.take(lut, indexed, axis=0, out=out)
+    return out
+
+
+try:  # multithreaded fused gather when numba is available
+    import numba
+
+    @numba.njit(parallel=True, cache=True)
+    def lut_expand(indexed, lut, out):  # noqa: F811
+        """Fill out[y, x, c] = lut[indexed[y, x], c] without a temporary."""
+        H, W = indexed.shape
+        for y in numba.prange(H):
+            for x in range(W):
+                i = indexed[y, x]
+                out[y, x, 0] = lut[i, 0]
+                out[y, x, 1] = lut[i, 1]
+                out[y, x, 2] = lut[i, 2]
+        return out
+
+except ImportError:
+    pass
@@ -2,15 +2,19 @@
 from __future__ import annotations
 import ctypes
 import platform
+import threading
 from ctypes import POINTER, Structure, byref, c_char_p, c_double, c_int
 
+import itertools
 import os
+from functools import lru_cache
 from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import Optional
 
+import numpy as np
 import pylink
-from psychopy import visual
+from psychopy import event, visual
 
 from stim4prf import logger
 from .EyeLinkCoreGraphicsPsychoPy import EyeLinkCoreGraphicsPsychoPy
@@ -43,6 +47,13 @@ class EyeTrackerBase(ABC):
     def close(self): ...
 
 
+# One time base per process plus a counter: EDF names stay unique even
+# when several trackers are constructed within the same second, without a
+# clock read per instantiation
+_EDF_TIME = datetime.now().strftime("%H%M")
+_EDF_COUNTER = itertools.count()
+
+
 # ----------- EyeLink Tracker Implementation -----------
 class EyeLinkTracker(EyeTrackerBase):
     """
@@ -53,6 +64,10 @@ class EyeLinkTracker(EyeTrackerBase):
 
     def __init__(self, outdir: str, dummy_mode: bool = False, skip_calibration: bool = False, skip_driftcorrection: bool = False, session_name: Optional6[str] = None):
         self.outdir = outdir
+        # Messages arrive from the render thread (flip callbacks) and the
+        # presenter's message worker concurrently; sendMessage is not
+        # documented thread-safe, so serialize all sends
+        self._send_lock = threading.Lock()
         os.makedirs(outdir, exist_ok=True)
         self.dummy_mode = dummy_mode
         self.el_tracker: Optional[pylink.EyeLink] = None
@@ -61,8 +76,13 @@ class EyeLinkTracker(EyeTrackerBase):
         self.skip_calibration = skip_calibration
         self.skip_driftcorrection = skip_driftcorrection
 
-        # EDF must be <= 8 characters (no extension). Use compact session tag + time.
-        base = (session_name or "S")[:3].upper() + datetime.now().strftime("%H%M%S")
+        # EDF must be <= 8 characters (no extension). Use compact session
+        # tag + process time base + counter.
+        base = (
+            (session_name or "S")[:2].upper()
+            + _EDF_TIME
+            + f"{next(_EDF_COUNTER) % 100:02d}"
+        )
         self.edf_file = (base[:8]).upper() + ".edf"
 
     # ---- lifecycle ----
@@ -174,7 +194,8 @@ class EyeLinkTracker(EyeTrackerBase):
     # ---- messaging & data ----
     def send_message(self, msg: str):
         if self.el_tracker is not None:
-            self.el_tracker.sendMessage(msg)
+            with self._send_lock:
+                self.el_tracker.sendMessage(msg)
 
     def download_data(self, trial_tsv_name: str):
         """
@@ -244,202 +265,215 @@ class EyeEvent(Structure):
     ]
 
 
-class MRCEyeTracking(EyeTrackerBase):
-    def __init__(self, dll_path="MRC_Eyetracking.dll"):
-        self.lib = ctypes.WinDLL(dll_path)
-
-        self.lib.eye_connect.argtypes = [c_char_p, c_int]
-        self.lib.eye_connect.restype = c_int
-
-        self.lib.eye_disconnect.argtypes = []
-        self.lib.eye_disconnect.restype = c_int
-
-        self.lib.eye_get_calibration_point.argtypes = [POINTER(c_double)]
-        self.lib.eye_get_calibration_point.restype = None
-
-        self.lib.eye_get_calibstate.argtypes = [POINTER(c_double)]
-        self.lib.eye_get_calibstate.restype = None
-
-        self.lib.eye_get_events_count.argtypes = [POINTER(c_int)]
-        self.lib.eye_get_events_count.restype = None
-
-        self.lib.eye_get_gaze.argtypes = [POINTER(c_double)]
-        self.lib.eye_get_gaze.restype = None
-
-        self.lib.eye_get_last_error.argtypes = []
-        self.lib.eye_get_last_error.restype = c_char_p
-
-        self.lib.eye_get_parameter.argtypes = [c_char_p, POINTER(c_double)]
-        self.lib.eye_get_parameter.restype = c_int
-
-        self.lib.eye_get_pupil_size.argtypes = [POINTER(c_double)]
-        self.lib.eye_get_pupil_size.restype = None
-
-        self.lib.eye_get_status.argtypes = [POINTER(c_int)]
-        self.lib.eye_get_status.restype = None
-
-        self.lib.eye_get_timestamp.argtypes = [POINTER(c_double)]
-        self.lib.eye_get_timestamp.restype = None
-
-        self.lib.eye_get_version.argtypes = []
-        self.lib.eye_get_version.restype = c_char_p
-
-        self.lib.eye_select_camera.argtypes = [c_int]
-        self.lib.eye_select_camera.restype = c_int
-
-        self.lib.eye_set_display_offset.argtypes = [c_int, c_int]
-        self.lib.eye_set_display_offset.restype = c_int
-
-        self.lib.eye_set_display_parameter.argtypes = [
-            c_double,
-            c_double,
-            ctypes.c_double,
-            ctypes.c_double,
-        ]
-        self.lib.eye_set_display_parameter.restype = c_int
-
-        self.lib.eye_set_displaymode.argtypes = [c_int, c_int]
-        self.lib.eye_set_displaymode.restype = c_int
-
-        self.lib.eye_set_parameter.argtypes = [c_char_p, c_char_p]
-        self.lib.eye_set_parameter.restype = c_int
-
-        self.lib.eye_set_software_event.argtypes = [c_char_p]
-        self.lib.eye_set_software_event.restype = c_int
-
-        self.lib.eye_start_calibrate.argtypes = [c_int]
-        self.lib.eye_start_calibrate.restype = c_int
-
-        self.lib.eye_start_stream.argtypes = [c_int]
-        self.lib.eye_start_stream.restype = c_int
-
-        self.lib.eye_start_video_recording.argtypes = []
-        self.lib.eye_start_video_recording.restype = c_int
-
-        self.lib.eye_stop_calibration.argtypes = []
-        self.lib.eye_stop_calibration.restype = c_int
+# NumPy mirror of EyeEvent, so polled events can be bulk-copied into a
+# structured array instead of boxing every field into a Python dict
+EYE_EVENT_DTYPE = np.dtype(
+    [
+        ("eye", np.int32),
+        ("event_type", np.int32),
+        ("timestamp", np.float64),
+        ("event_text", "S256"),
+        ("param1", np.float64),
+        ("param2", np.float64),
+        ("param3", np.float64),
+        ("param4", np.float64),
+        ("param5", np.float64),
+    ]
+)
+assert EYE_EVENT_DTYPE.itemsize == ctypes.sizeof(EyeEvent)
+
+
+# (name, argtypes, restype) for every MRC_Eyetracking.dll entry point
+_MRC_SIGNATURES = [
+    ("eye_connect", [c_char_p, c_int], c_int),
+    ("eye_disconnect", [], c_int),
+    ("eye_get_calibration_point", [POINTER(c_double)], None),
+    ("eye_get_calibstate", [POINTER(c_double)], None),
+    ("eye_get_events_count", [POINTER(c_int)], None),
+    ("eye_get_gaze", [POINTER(c_double)], None),
+    ("eye_get_last_error", [], c_char_p),
+    ("eye_get_parameter", [c_char_p, POINTER(c_double)], c_int),
+    ("eye_get_pupil_size", [POINTER(c_double)], None),
+    ("eye_get_status", [POINTER(c_int)], None),
+    ("eye_get_timestamp", [POINTER(c_double)], None),
+    ("eye_get_version", [], c_char_p),
+    ("eye_select_camera", [c_int], c_int),
+    ("eye_set_display_offset", [c_int, c_int], c_int),
+    ("eye_set_display_parameter", [c_double, c_double, c_double, c_double], c_int),
+    ("eye_set_displaymode", [c_int, c_int], c_int),
+    ("eye_set_parameter", [c_char_p, c_char_p], c_int),
+    ("eye_set_software_event", [c_char_p], c_int),
+    ("eye_start_calibrate", [c_int], c_int),
+    ("eye_start_stream", [c_int], c_int),
+    ("eye_start_video_recording", [], c_int),
+    ("eye_stop_calibration", [], c_int),
+    ("eye_stop_stream", [], c_int),
+    ("eye_stop_video_recording", [], c_int),
+    ("eye_get_events_matlab", [POINTER(c_int)], POINTER(EyeEvent)),
+]
+
+
+@lru_cache(maxsize=256)
+def _enc(s: str) -> bytes:
+    """Cached UTF-8 encoding for parameter names/values sent repeatedly."""
+    return s.encode("utf-8")
+
+
+@lru_cache(maxsize=256)
+def _enc_event(s: str) -> bytes:
+    """Cached null-terminated ASCII form for software event messages."""
+    return s.encode("ascii") + b"\x00"
+
+
+def _configure_dll(lib):
+    """Apply the MRC signature table once per loaded DLL handle."""
+    if getattr(lib, "_stim4prf_configured", False):
+        return
+    for name, argtypes, restype in _MRC_SIGNATURES:
+        fn = getattr(lib, name)
+        fn.argtypes = argtypes
+        fn.restype = restype
+    lib._stim4prf_configured = True
 
-        self.lib.eye_stop_stream.argtypes = []
-        self.lib.eye_stop_stream.restype = c_int
 
-        self.lib.eye_stop_video_recording.argtypes = []
-        self.lib.eye_stop_video_recording.restype = c_int
+class MRCEyeTracking(EyeTrackerBase):
+    # Calibration status changes on the order of seconds; poll it every
+    # few flips of the vsync-paced calibration loop instead of every frame
+    _STATUS_POLL_PERIOD = 5
 
-        self.lib.eye_get_events_matlab.argtypes = [POINTER(c_int)]
-        self.lib.eye_get_events_matlab.restype = POINTER(EyeEvent)
+    def __init__(self, dll_path="MRC_Eyetracking.dll"):
+        self.lib = ctypes.WinDLL(dll_path)
+        _configure_dll(self.lib)
+        # Messages arrive from the render thread (flip callbacks) and the
+        # presenter's message worker concurrently; the DLL is not
+        # documented thread-safe, so serialize all sends
+        self._send_lock = threading.Lock()
+
+        # Reusable result buffers for the high-rate polling getters, so a
+        # 500 Hz poll loop does not allocate fresh ctypes arrays per call
+        self._calib_point_buf = (c_double * 3)()
+        self._calibstate_buf = (c_double * 2)()
+        self._gaze_buf = (c_double * 5)()
+        self._pupil_buf = (c_double * 4)()
+        self._count_buf = c_int(-1)
+        self._status_buf = c_int(-1)
+        self._timestamp_buf = c_double(-1)
+        self._param_buf = c_double(0.0)
+
+        # Zero-copy ndarray views over the reusable buffers: the getters
+        # refill the buffer in place and return the same view, so no list
+        # of boxed floats is built per call. The returned array is
+        # overwritten by the next call -- copy() it to keep a snapshot.
+        self._calib_point_view = np.frombuffer(self._calib_point_buf, dtype=np.float64)
+        self._calibstate_view = np.frombuffer(self._calibstate_buf, dtype=np.float64)
+        self._gaze_view = np.frombuffer(self._gaze_buf, dtype=np.float64)
+        self._pupil_view = np.frombuffer(self._pupil_buf, dtype=np.float64)
+
+        # Trivial pass-throughs are bound straight to the DLL functions --
+        # one Python frame less per call; only wrappers that convert
+        # strings or fill buffers remain methods
+        for name in (
+            "eye_disconnect",
+            "eye_select_camera",
+            "eye_set_display_offset",
+            "eye_set_display_parameter",
+            "eye_set_displaymode",
+            "eye_start_calibrate",
+            "eye_start_stream",
+            "eye_start_video_recording",
+            "eye_stop_calibration",
+            "eye_stop_stream",
+            "eye_stop_video_recording",
+        ):
+            setattr(self, name, getattr(self.lib, name))
+
+        # Bind the hot-path entry points once: each self.lib.<name> access
+        # goes through WinDLL.__getattr__ and rebuilds a function proxy
+        self._eye_get_calibration_point = self.lib.eye_get_calibration_point
+        self._eye_get_calibstate = self.lib.eye_get_calibstate
+        self._eye_get_events_count = self.lib.eye_get_events_count
+        self._eye_get_events_matlab = self.lib.eye_get_events_matlab
+        self._eye_get_gaze = self.lib.eye_get_gaze
+        self._eye_get_pupil_size = self.lib.eye_get_pupil_size
+        self._eye_get_status = self.lib.eye_get_status
+        self._eye_get_timestamp = self.lib.eye_get_timestamp
 
     def eye_connect(self, ip: str, port: int) -> int:
-        return self.lib.eye_connect(ip.encode("utf-8"), port)
-
-    def eye_disconnect(self) -> int:
-        return self.lib.eye_disconnect()
+        return self.lib.eye_connect(_enc(ip), port)
 
     def eye_get_calibration_point(self):
-        data = (c_double * 3)()
-        self.lib.eye_get_calibration_point(data)
-        return list(data)
+        self._eye_get_calibration_point(self._calib_point_buf)
+        return self._calib_point_view
 
     def eye_get_calibstate(self):
-        data = (c_double * 2)()
-        self.lib.eye_get_calibstate(data)
-        return list(data)
+        self._eye_get_calibstate(self._calibstate_buf)
+        return self._calibstate_view
 
     def eye_get_events(self, count: int):
+        """
+        Fetch up to count pending events as a NumPy structured array
+        (EYE_EVENT_DTYPE). Each DLL struct is memmove'd into the array in
+        one copy instead of boxing all nine fields into a Python dict.
+        """
+        events = np.empty(count, dtype=EYE_EVENT_DTYPE)
+        itemsize = EYE_EVENT_DTYPE.itemsize
         c_count = c_int(count)
-        events = []
+        n = 0
         for _ in range(count):
-            ptr = self.lib.eye_get_events_matlab(byref(c_count))
-            if ptr:
-                evt = ptr.contents
-                events.append(
-                    {
-                        "eye": evt.eye,
-                        "event_type": evt.event_type,
-                        "timestamp": evt.timestamp,
-                        "event_text": evt.event_text.decode("utf-8"),
-                        "param1": evt.param1,
-                        "param2": evt.param2,
-                        "param3": evt.param3,
-                        "param4": evt.param4,
-                        "param5": evt.param5,
-                    }
-                )
-        return events
+            ptr = self._eye_get_events_matlab(byref(c_count))
+            if not ptr:
+                continue
+            ctypes.memmove(events.ctypes.data + n * itemsize, ptr, itemsize)
+            n += 1
+        return events[:n]
+
+    def eye_get_events_chunk(self):
+        """
+        Drain all currently pending events in one call: query the pending
+        count once, then bulk-fetch that many into a structured array.
+        Lets callers catch up after a stall without guessing a count.
+        """
+        count = self.eye_get_events_count()
+        if count <= 0:
+            return np.empty(0, dtype=EYE_EVENT_DTYPE)
+        return self.eye_get_events(count)
 
     def eye_get_events_count(self) -> int:
-        count = c_int(-1)
-        self.lib.eye_get_events_count(byref(count))
-        return count.value
+        self._eye_get_events_count(byref(self._count_buf))
+        return self._count_buf.value
 
     def eye_get_gaze(self):
-        data = (c_double * 5)()
-        self.lib.eye_get_gaze(data)
-        return list(data)
+        self._eye_get_gaze(self._gaze_buf)
+        return self._gaze_view
 
     def eye_get_last_error(self) -> str:
         return self.lib.eye_get_last_error().decode("utf-8")
 
     def eye_get_parameter(self, name: str):
-        val = c_double(0.0)
-        result = self.lib.eye_get_parameter(name.encode("utf-8"), byref(val))
-        return result, val.value
+        self._param_buf.value = 0.0
+        result = self.lib.eye_get_parameter(_enc(name), byref(self._param_buf))
+        return result, self._param_buf.value
 
     def eye_get_pupil_size(self):
-        data = (c_double * 4)()
-        self.lib.eye_get_pupil_size(data)
-        return list(data)
+        self._eye_get_pupil_size(self._pupil_buf)
+        return self._pupil_view
 
     def eye_get_status(self) -> int:
-        status = c_int(-1)
-        self.lib.eye_get_status(byref(status))
-        return status.value
+        self._eye_get_status(byref(self._status_buf))
+        return self._status_buf.value
 
     def eye_get_timestamp(self) -> float:
-        ts = c_double(-1)
-        self.lib.eye_get_timestamp(byref(ts))
-        return ts.value
+        self._eye_get_timestamp(byref(self._timestamp_buf))
+        return self._timestamp_buf.value
 
     def eye_get_version(self) -> str:
         return self.lib.eye_get_version().decode("utf-8")
 
-    def eye_select_camera(self, eye: int) -> int:
-        return self.lib.eye_select_camera(eye)
-
-    def eye_set_display_offset(self, width_offset: int, height_offset: int) -> int:
-        return self.lib.eye_set_display_offset(width_offset, height_offset)
-
-    def eye_set_display_parameter(
-        self, width: float, height: float, distance: float, pixelsize: float
-    ) -> int:
-        return self.lib.eye_set_display_parameter(width, height, distance, pixelsize)
-
-    def eye_set_displaymode(self, width: int, height: int) -> int:
-        return self.lib.eye_set_displaymode(width, height)
-
     def eye_set_parameter(self, name: str, value: str) -> int:
-        return self.lib.eye_set_parameter(name.encode("utf-8"), value.encode("utf-8"))
+        return self.lib.eye_set_parameter(_enc(name), _enc(value))
 
     def eye_set_software_event(self, value: str) -> int:
-        event_bytes = value.encode("ascii") + b"\x00"
-        return self.lib.eye_set_software_event(event_bytes)
-
-    def eye_start_calibrate(self, points: int) -> int:
-        return self.lib.eye_start_calibrate(points)
-
-    def eye_start_stream(self, parameter: int) -> int:
-        return self.lib.eye_start_stream(parameter)
-
-    def eye_start_video_recording(self) -> int:
-        return self.lib.eye_start_video_recording()
-
-    def eye_stop_calibration(self) -> int:
-        return self.lib.eye_stop_calibration()
-
-    def eye_stop_stream(self) -> int:
-        return self.lib.eye_stop_stream()
-
-    def eye_stop_video_recording(self) -> int:
-        return self.lib.eye_stop_video_recording()
+        return self.lib.eye_set_software_event(_enc_event(value))
 
     def connect(self, ip="localhost"):
         self.eye_connect(ip, 5257)
@@ -490,7 +524,16 @@ class MRCEyeTracking(EyeTrackerBase):
                 self.eye_start_calibrate(calibration_points)
                 calibration_running = True
 
-            point = [0, 0, 0]
+            # One calibration dot reused across the loop; rebuilding it per
+            # iteration reallocates GL buffers at the flip rate
+            stimulus = visual.Circle(
+                win=win,
+                radius=dot_size / 2,
+                fillColor=dot_color,
+                lineColor=dot_color,
+            )
+            last_point = None
+            frame_ctr = 0
             while calibration_running == True:
                 keys = event.getKeys()
                 if "escape" in keys or "q" in keys:
@@ -498,22 +541,27 @@ class MRCEyeTracking(EyeTrackerBase):
                     self.eye_stop_calibration()
                     self.eye_stop_stream()
                     break
-                if self.eye_get_status() == 2:
-                    print("calibration done")
-                    self.eye_stop_calibration()
-                    calibration_running = False
-                    self.eye_stop_stream()
+                # edge-triggered-ish status check: the DLL round-trip is the
+                # cost here, and a few flips of latency on "done" is invisible
+                if frame_ctr % self._STATUS_POLL_PERIOD == 0:
+                    if self.eye_get_status() == 2:
+                        print("calibration done")
+                        self.eye_stop_calibration()
+                        calibration_running = False
+                        self.eye_stop_stream()
+                frame_ctr += 1
                 point = self.eye_get_calibration_point()
-                stimulus = visual.Circle(
-                    win=win,
-                    radius=dot_size / 2,
-                    fillColor=dot_color,
-                    lineColor=dot_color,
-                    pos=(
-                        point[1] - tracking_groesse / 2,
-                        tracking_groesse / 2 - point[2],
-                    ),
-                )
+                # the getter returns a reused buffer view; compare the two
+                # coordinates as scalars rather than holding the view
+                point_key = (point[1], point[2])
+                if point_key != last_point:
+                    # only touch .pos when the target moved; the setter runs
+                    # PsychoPy's full attribute/vertex update machinery
+                    stimulus.pos = (
+                        point_key[0] - tracking_groesse / 2,
+                        tracking_groesse / 2 - point_key[1],
+                    )
+                    last_point = point_key
                 stimulus.draw()
                 win.flip()
         else:
@@ -526,7 +574,8 @@ class MRCEyeTracking(EyeTrackerBase):
         self.eye_set_parameter("eye_save_tracking", "false")
 
     def send_message(self, msg):
-        self.eye_set_software_event(msg)
+        with self._send_lock:
+            self.eye_set_software_event(msg)
 
     def download_data(self):
         pass
@@ -1,3 +1,4 @@
+import math
 import random
 from abc import ABC, abstractmethod
 
@@ -7,10 +8,39 @@ from psychopy import event, visual
 from stim4prf import logger
 
 
+def _apply_refractory(switches, min_gap):
+    """Zero out scheduled switches closer than min_gap frames to the previous one."""
+    last = -min_gap
+    for i in range(len(switches)):
+        if switches[i]:
+            if i - last < min_gap:
+                switches[i] = False
+            else:
+                last = i
+    return switches
+
+
+try:  # compile the schedule pass when numba is available
+    from numba import njit
+
+    _apply_refractory = njit(cache=True)(_apply_refractory)
+except ImportError:
+    pass
+
+
+def _no_log(color):
+    """Switch-logging stand-in for non-verbose fixations."""
+    pass
+
+
 # ----------- Fixation Base and Variants -----------
 class Fixation(ABC):
     """Abstract base class for fixation markers."""
 
+    # Slotted: fixation attributes are read every frame, so skip the
+    # per-instance __dict__ lookup on the hot path
+    __slots__ = ("verbose",)
+
     def __init__(self, verbose: bool = False):
         self.verbose = verbose
 
@@ -26,6 +56,24 @@ class Fixation(ABC):
 class FixationDot(Fixation):
     """A colored dot fixation marker that occasionally changes color."""
 
+    __slots__ = (
+        "win",
+        "radius",
+        "colors",
+        "color_switch_prob",
+        "last_switch_time",
+        "switch_log",
+        "min_switch_interval",
+        "circles",
+        "_color_idx",
+        "_switch_schedule",
+        "_frame",
+        "_next_switch_time",
+        "_log_switch",
+        "_rand",
+        "_rng",
+    )
+
     def __init__(
         self,
         win,
@@ -34,54 +82,115 @@ class FixationDot(Fixation):
         color_switch_prob: float = 0.01,
         min_switch_interval: float = 2.0,
         verbose: bool = False,
+        seed: int = None,
     ):
         super().__init__(verbose)
         self.win = win
         self.radius = size / 2
         self.colors = colors
         self.color_switch_prob = color_switch_prob
-        self.current_color = colors[0]
         self.last_switch_time = None
         self.switch_log = []
         self.min_switch_interval = min_switch_interval
-        self.circle = visual.Circle(
-            win,
-            radius=self.radius,
-            fillColor=self.current_color,
-            lineColor=self.current_color,
-            pos=(0, 0),
-            units="pix",
-        )
+        # One pre-built circle per color: switching toggles an index instead
+        # of reassigning colors, which would make PsychoPy re-parse the color.
+        # 32 edges is visually indistinguishable at fixation-dot sizes and
+        # tessellates far fewer vertices than PsychoPy's default.
+        self.circles = [
+            visual.Circle(
+                win,
+                radius=self.radius,
+                edges=32,
+                fillColor=color,
+                lineColor=color,
+                pos=(0, 0),
+                units="pix",
+            )
+            for color in colors
+        ]
+        self._color_idx = 0
+        self._switch_schedule = None
+        self._frame = 0
+        self._next_switch_time = 0.0
+        # Per-instance RNGs, seedable for reproducible runs: _rng draws the
+        # precomputed schedule, _rand serves the per-frame fallback path
+        # (bound method cached: no module-level attribute lookup per draw)
+        self._rng = np.random.default_rng(seed)
+        self._rand = random.Random(seed).random
+        # Bound once at construction: non-verbose instances skip the branch
+        # and the f-string formatting entirely on every switch
+        self._log_switch = self._log_switch_verbose if verbose else _no_log
+
+    @property
+    def current_color(self):
+        return self.colors[self._color_idx]
+
+    def prepare(self, n_frames: int, frame_duration: float) -> None:
+        """Precompute the color-switch schedule for a run of n_frames."""
+        switches = self._rng.random(n_frames) < self.color_switch_prob
+        min_gap = int(np.ceil(self.min_switch_interval / frame_duration))
+        self._switch_schedule = _apply_refractory(switches, min_gap)
+        self._frame = 0
 
-    def update(self, now: float = None, et = None) -> None:
+    def _log_switch_verbose(self, color):
+        logger.info(f"Fixation color switched to {color}")
+
+    def _switch(self, now, et=None, win=None):
+        self._color_idx = 1 - self._color_idx
+        self.last_switch_time = now
+        self._next_switch_time = now + self.min_switch_interval
+        self.switch_log.append((now, self.current_color))
+        if et:
+            msg = f"fixation color change to {self.current_color}"
+            if win is not None:
+                # stamp the message at the actual flip, not at draw time
+                win.callOnFlip(et.send_message, msg=msg)
+            else:
+                et.send_message(msg=msg)
+        self._log_switch(self.current_color)
+
+    def update(self, now: float = None, et = None, win = None) -> None:
         if now is None:
             return
-        if (
-            self.last_switch_time is None
-            or (now - self.last_switch_time) >= self.min_switch_interval
-        ):
-            if random.random() < self.color_switch_prob:
-                self.current_color = (
-                    self.colors[1]
-                    if self.current_color == self.colors[0]
-                    else self.colors[0]
-                )
-                self.circle.fillColor = self.current_color
-                self.circle.lineColor = self.current_color
-                self.last_switch_time = now
-                self.switch_log.append((now, self.current_color))
-                if et:
-                    et.send_message(msg=f"fixation color change to {self.current_color}")
-                if self.verbose:
-                    logger.info(f"Fixation color switched to {self.current_color}")
+        if self._switch_schedule is not None:
+            # precomputed schedule: no RNG in the per-frame path
+            if (
+                self._frame < len(self._switch_schedule)
+                and self._switch_schedule[self._frame]
+            ):
+                self._switch(now, et, win)
+            self._frame += 1
+        elif now >= self._next_switch_time:
+            # one compare on the common (refractory) path instead of a
+            # None check plus subtraction; RNG cadence is unchanged
+            if self._rand() < self.color_switch_prob:
+                self._switch(now, et, win)
 
     def draw(self) -> None:
-        self.circle.draw()
+        self.circles[self._color_idx].draw()
 
 
 class FixationCross(Fixation):
     """A colored cross fixation marker that occasionally changes color."""
 
+    __slots__ = (
+        "win",
+        "size",
+        "colors",
+        "color_switch_prob",
+        "last_switch_time",
+        "switch_log",
+        "min_switch_interval",
+        "texts",
+        "_color_idx",
+        "_switch_schedule",
+        "_frame",
+        "_next_switch_time",
+        "_log_switch",
+        "_rand",
+        "_rng",
+    )
+
     def __init__(
         self,
         win,
@@ -90,48 +199,89 @@ class FixationCross(Fixation):
         color_switch_prob: float = 0.01,
         min_switch_interval: float = 2.0,
         verbose: bool = False,
+        seed: int = None,
     ):
         super().__init__(verbose)
         self.win = win
         self.size = size
         self.colors = colors
         self.color_switch_prob = color_switch_prob
-        self.current_color = colors[0]
         self.last_switch_time = None
         self.switch_log = []
         self.min_switch_interval = min_switch_interval
-        self.text = visual.TextStim(
-            win,
-            text="+",
-            color=self.current_color,
-            height=self.size,
-            pos=(0, 0),
-            units="pix",
-        )
+        # One pre-built cross per color: switching toggles an index instead
+        # of reassigning colors, which would make PsychoPy re-parse the color
+        self.texts = [
+            visual.TextStim(
+                win,
+                text="+",
+                color=color,
+                height=self.size,
+                pos=(0, 0),
+                units="pix",
+            )
+            for color in colors
+        ]
+        self._color_idx = 0
+        self._switch_schedule = None
+        self._frame = 0
+        self._next_switch_time = 0.0
+        # Per-instance RNGs, seedable for reproducible runs: _rng draws the
+        # precomputed schedule, _rand serves the per-frame fallback path
+        # (bound method cached: no module-level attribute lookup per draw)
+        self._rng = np.random.default_rng(seed)
+        self._rand = random.Random(seed).random
+        # Bound once at construction: non-verbose instances skip the branch
+        # and the f-string formatting entirely on every switch
+        self._log_switch = self._log_switch_verbose if verbose else _no_log
+
+    @property
+    def current_color(self):
+        return self.colors[self._color_idx]
 
-    def update(self, now: float = None, et = None) -> None:
+    def prepare(self, n_frames: int, frame_duration: float) -> None:
+        """Precompute the color-switch schedule for a run of n_frames."""
+        switches = self._rng.random(n_frames) < self.color_switch_prob
+        min_gap = int(np.ceil(self.min_switch_interval / frame_duration))
+        self._switch_schedule = _apply_refractory(switches, min_gap)
+        self._frame = 0
+
+    def _log_switch_verbose(self, color):
+        logger.info(f"Fixation color switched to {color}")
+
+    def _switch(self, now, et=None, win=None):
+        self._color_idx = 1 - self._color_idx
+        self.last_switch_time = now
+        self._next_switch_time = now + self.min_switch_interval
+        self.switch_log.append((now, self.current_color))
+        if et:
+            msg = f"fixation color change to {self.current_color}"
+            if win is not None:
+                # stamp the message at the actual flip, not at draw time
+                win.callOnFlip(et.send_message, msg=msg)
+            else:
+                et.send_message(msg=msg)
+        self._log_switch(self.current_color)
+
+    def update(self, now: float = None, et = None, win = None) -> None:
         if now is None:
             return
-        if (
-            self.last_switch_time is None
-            or (now - self.last_switch_time) >= self.min_switch_interval
-        ):
-            if random.random() < self.color_switch_prob:
-                self.current_color = (
-                    self.colors[1]
-                    if self.current_color == self.colors[0]
-                    else self.colors[0]
-                )
-                self.text.color = self.current_color
-                self.last_switch_time = now
-                self.switch_log.append((now, self.current_color))
-                if et:
-                    et.send_message(msg=f"fixation color change to {self.current_color}")
-                if self.verbose:
-                    logger.info(f"Fixation color switched to {self.current_color}")
+        if self._switch_schedule is not None:
+            # precomputed schedule: no RNG in the per-frame path
+            if (
+                self._frame < len(self._switch_schedule)
+                and self._switch_schedule[self._frame]
+            ):
+                self._switch(now, et, win)
+            self._frame += 1
+        elif now >= self._next_switch_time:
+            # one compare on the common (refractory) path instead of a
+            # None check plus subtraction; RNG cadence is unchanged
+            if self._rand() < self.color_switch_prob:
+                self._switch(now, et, win)
 
     def draw(self) -> None:
-        self.text.draw()
+        self.texts[self._color_idx].draw()
 
 
 class ABCTargetFixation:
@@ -143,6 +293,26 @@ class ABCTargetFixation:
     Draws a fixation target with two concentric circles and a central cross, following the design in the referenced paper.
     """
 
+    __slots__ = (
+        "win",
+        "width_cm",
+        "dist_cm",
+        "d1_deg",
+        "d2_deg",
+        "color_oval",
+        "color_cross",
+        "color_dot",
+        "verbose",
+        "ppd",
+        "r_outer",
+        "r_inner",
+        "cross_width",
+        "outer_circle",
+        "inner_circle",
+        "hor_line",
+        "ver_line",
+    )
+
     def __init__(
         self,
         win,
@@ -165,9 +335,14 @@ class ABCTargetFixation:
         self.color_dot = color_dot
         self.verbose = verbose
 
-        # Calculate pixels per degree
+        # Calculate pixels per degree (plain math: scalar, not an array op)
         win_width_pix = win.size[0]
-        self.ppd = np.pi * win_width_pix / np.arctan(width_cm / dist_cm / 2) / 360
+        self.ppd = math.pi * win_width_pix / math.atan(width_cm / dist_cm / 2) / 360
+
+        # Precomputed target geometry in pixels
+        self.r_outer = (d1_deg / 2) * self.ppd
+        self.r_inner = (d2_deg / 2) * self.ppd
+        self.cross_width = d2_deg * self.ppd
 
         self._create_shapes()
 
@@ -175,7 +350,7 @@ class ABCTargetFixation:
         # Outer circle
         self.outer_circle = visual.Circle(
             self.win,
-            radius=(self.d1_deg / 2) * self.ppd,
+            radius=self.r_outer,
             edges=128,
             lineColor=None,
             fillColor=self.color_oval,
@@ -184,7 +359,7 @@ class ABCTargetFixation:
         # Inner circle
         self.inner_circle = visual.Circle(
             self.win,
-            radius=(self.d2_deg / 2) * self.ppd,
+            radius=self.r_inner,
             edges=128,
             lineColor=None,
             fillColor=self.color_oval,
@@ -193,20 +368,19 @@ class ABCTargetFixation:
         # Horizontal line
         self.hor_line = visual.Line(
             self.win,
-            start=(-self.d1_deg / 2 * self.ppd, 0),
-            end=(self.d1_deg / 2 * self.ppd, 0),
+            start=(-self.r_outer, 0),
+            end=(self.r_outer, 0),
             lineColor=self.color_cross,
-            lineWidth=self.d2_deg * self.ppd,
+            lineWidth=self.cross_width,
         )
         # Vertical line
         self.ver_line = visual.Line(
             self.win,
-            start=(0, -self.d1_deg / 2 * self.ppd),
-            end=(0, self.d1_deg / 2 * self.ppd),
+            start=(0, -self.r_outer),
+            end=(0, self.r_outer),
             lineColor=self.color_cross,
-            lineWidth=self.d2_deg * self.ppd,
+            lineWidth=self.cross_width,
         )
-
     def update(self, color=None, now=None):
         """
         Update the color of the central dot.
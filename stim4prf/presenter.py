@@ -1,5 +1,7 @@
-import csv
+import logging
 import os
+import queue
+import threading
 from datetime import datetime
 
 import numpy as np
@@ -8,16 +10,30 @@ from psychopy.hardware import keyboard
 
 from stim4prf import logger
 
-from .eyetracking import EyeLinkTracker, MRCEyeTracking
+from ._kernels import lut_expand
 from .fixation import ABCTargetFixation, FixationCross, FixationDot
 from .reaction_time import analyze_reaction_times
 
+# Shared event labels: every log row of a kind references the same string
+# object, keeping the merged tuples homogeneous apart from the float key
+FRAME_ONSET = "frame_onset"
+COLOR_SWITCH = "fixation_color_switch"
+BUTTON_PRESS = "button_press"
+SCANNER_TRIGGER = "scanner_trigger"
+
+
+# Screen geometry per screen index: querying pyglet costs a display-server
+# round-trip, and the answer does not change between runs
+_SCREEN_CACHE = {}
+
 
 def get_screen_size(screen: int):
     """
     Return (width, height) for the requested screen.
     Falls back to primary if unavailable.
     """
+    if screen in _SCREEN_CACHE:
+        return _SCREEN_CACHE[screen]
     try:
         import pyglet
 
@@ -27,19 +43,21 @@ def get_screen_size(screen: int):
             logger.info(
                 f"Screen size {screens[screen].width} x {screens[screen].height}"
             )
-            return screens[screen].width, screens[screen].height
+            size = screens[screen].width, screens[screen].height
         else:
             logger.warning(
                 f"Requested screen {screen} not available. Falling back to primary screen (0)."
             )
             logger.info(f"Screen size {screens[0].width} x {screens[0].height}")
-            return screens[0].width, screens[0].height
+            size = screens[0].width, screens[0].height
     except Exception as e:
         logger.warning(
             f"Could not query screens ({e}). Using default PsychoPy screen size."
         )
         # Use PsychoPy default; usually fills the screen for fullscr=True
-        return None, None
+        size = None, None
+    _SCREEN_CACHE[screen] = size
+    return size
 
 
 # ----------- Main Experiment Presenter -----------
@@ -83,13 +101,34 @@ class PRFStimulusPresenter:
         # --- Load the stimulus ---
         self.indexed_matrix, self.lut, self.frame_duration = self.loader.load()
 
-        # --- Apply image transformations ONCE here ---
+        # --- Flips are applied GPU-side via ImageStim flipVert/flipHoriz
+        # (a texture-coordinate sign change), so the index data keeps its
+        # contiguous layout and the memory-mapped path gets flips too ---
         self.flipVert = flipVert
         self.flipHoriz = flipHoriz
-        if flipVert:
-            self.indexed_matrix = np.flip(self.indexed_matrix, axis=1)
-        if flipHoriz:
-            self.indexed_matrix = np.flip(self.indexed_matrix, axis=2)
+        if isinstance(self.indexed_matrix, np.ndarray):
+            # --- Deduplicate: pRF protocols repeat frames (bar holds,
+            # blanks), so only the distinct images are decoded and kept ---
+            n = self.indexed_matrix.shape[0]
+            flat = np.ascontiguousarray(self.indexed_matrix).reshape(n, -1)
+            rows = flat.view(
+                np.dtype((np.void, flat.shape[1] * flat.dtype.itemsize))
+            ).ravel()
+            _, uniq_idx, frame_map = np.unique(
+                rows, return_index=True, return_inverse=True
+            )
+            self.frame_map = frame_map.astype(np.int32)
+            # --- Decode the unique frames through the LUT once, not per
+            # flip; frames stay float32 in [0,1] for the rgb1 pipeline ---
+            self.rgb_frames = np.ascontiguousarray(
+                self.lut[self.indexed_matrix[uniq_idx]]
+            )
+            if verbose:
+                logger.info(f"{len(uniq_idx)} unique frames out of {n}")
+        else:
+            # lazy (memory-mapped) frame sequence: decode per frame instead
+            self.rgb_frames = None
+            self.frame_map = None
 
         self.nFrames = self.indexed_matrix.shape[0]
 
@@ -120,16 +159,78 @@ class PRFStimulusPresenter:
         # Initialize fixation
         self.fixation = self.fixation_class(self.win, **self.fixation_kwargs)
 
-        # Initialize image stimulus
+        # Initialize image stimuli
         h, w = self.indexed_matrix.shape[1:3]
-        dummy_rgb = np.zeros((h, w, 3), dtype=np.float32)
-        self.img_stim = visual.ImageStim(
-            self.win,
-            image=dummy_rgb,
-            units="pix",
-            size=(w, h),
-            colorSpace="rgb1",
-        )
+        self.img_stim = None
+        self.frame_stims = None
+        self._rgb_buf = None
+        if self.rgb_frames is not None:
+            # One ImageStim per unique frame: each texture goes to the GPU
+            # once here, so presenting a frame in the loop is a draw of a
+            # resident texture -- no setImage, no per-flip re-upload
+            self.frame_stims = [
+                visual.ImageStim(
+                    self.win,
+                    image=frame,
+                    units="pix",
+                    size=(w, h),
+                    colorSpace="rgb1",
+                    flipVert=self.flipVert,
+                    flipHoriz=self.flipHoriz,
+                )
+                for frame in self.rgb_frames
+            ]
+        else:
+            # lazy loaders decode per frame into a reused scratch buffer and
+            # upload through a single ImageStim
+            dummy_rgb = np.zeros((h, w, 3), dtype=np.float32)
+            self.img_stim = visual.ImageStim(
+                self.win,
+                image=dummy_rgb,
+                units="pix",
+                size=(w, h),
+                colorSpace="rgb1",
+                flipVert=self.flipVert,
+                flipHoriz=self.flipHoriz,
+            )
+            self._rgb_buf = np.empty((h, w, 3), dtype=np.float32)
+            # warm the (possibly numba-compiled) decode kernel here, so the
+            # first frame in the loop does not pay the JIT cost
+            lut_expand(np.asarray(self.indexed_matrix[0]), self.lut, self._rgb_buf)
+
+        # Warm the GL pipeline: draw one real stimulus frame and the fixation
+        # into the back buffer so shader compilation and texture binding
+        # happen now, not on the first post-trigger flip. The buffer is
+        # cleared without flipping, so nothing reaches the screen.
+        warm_stim = self.frame_stims[0] if self.frame_stims else self.img_stim
+        warm_stim.draw()
+        self.fixation.draw()
+        self.win.clearBuffer()
+
+    def _start_message_worker(self):
+        """
+        Start the background sender for in-loop eyetracker messages, so a
+        stalling tracker link never extends the frame budget.
+        """
+        self._et_q = queue.SimpleQueue()
+        self._et_thread = threading.Thread(target=self._message_worker, daemon=True)
+        self._et_thread.start()
+
+    def _message_worker(self):
+        while True:
+            msg = self._et_q.get()
+            if msg is None:
+                return
+            try:
+                self.eyetracker.send_message(msg=msg)
+            except Exception as e:
+                logger.warning(f"Eyetracker message failed: {e}")
+
+    def _stop_message_worker(self):
+        if getattr(self, "_et_thread", None) is not None:
+            self._et_q.put(None)
+            self._et_thread.join(timeout=2.0)
+            self._et_thread = None
 
     def run(
         self,
@@ -151,6 +252,10 @@ class PRFStimulusPresenter:
         # --- Setup window, fixation, and image stimulus ---
         self._setup_run()
 
+        # --- Precompute the fixation color-switch schedule for this run ---
+        if hasattr(self.fixation, "prepare"):
+            self.fixation.prepare(self.nFrames, self.frame_duration)
+
         # --- Show break screen and wait for ENTER ---
         break_text = visual.TextStim(
             self.win,
@@ -162,10 +267,14 @@ class PRFStimulusPresenter:
         break_text.draw()
 
         self.win.flip()
-        kb = keyboard.Keyboard()
+        # PTB backend: a background thread reads HID reports and stamps
+        # each event with a sub-ms hardware timestamp, independent of when
+        # the render loop happens to poll
+        kb = keyboard.Keyboard(backend="ptb")
         kb.clearEvents()
         while True:
-            keys = kb.getKeys(
+            # blocks on OS keyboard events instead of polling at 100 Hz
+            keys = kb.waitKeys(
                 keyList=["return", "enter", "space", self.abort_key], waitRelease=False
             )
             if any(k.name == self.abort_key for k in keys):
@@ -180,7 +289,6 @@ class PRFStimulusPresenter:
                 break
             elif any(k.name in ("return", "enter") for k in keys):
                 break
-            core.wait(0.01)
 
         # --- Prepare logging ---
         timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
@@ -231,8 +339,8 @@ class PRFStimulusPresenter:
         if self.verbose:
             logger.info("Awaiting scanner trigger...")
 
-        all_events = []  # Collect all events for logging
         aborted = False
+        prefetch_stop = None
 
         if self.eyetracker:
             # Start eyetracker recording
@@ -242,20 +350,18 @@ class PRFStimulusPresenter:
             self.eyetracker.send_message(
                 msg=f"run about to start sub-{subject} ses-{session} run-{run}"
             )
+            self._start_message_worker()
 
         try:
             # --- Wait for scanner trigger or abort key ---
-            while True:
-                keys = kb.getKeys(
-                    keyList=[self.trigger_key, self.abort_key], waitRelease=False
-                )
-                if any(k.name == self.abort_key for k in keys):
-                    logger.info("Aborted by user before start.")
-                    aborted = True
-                    break
-                elif any(k.name == self.trigger_key for k in keys):
-                    break
-                core.wait(0.001)
+            # waitKeys sleeps on the OS event queue: no 1 kHz wakeups while
+            # idling, and the trigger is picked up as soon as it arrives
+            keys = kb.waitKeys(
+                keyList=[self.trigger_key, self.abort_key], waitRelease=False
+            )
+            if any(k.name == self.abort_key for k in keys):
+                logger.info("Aborted by user before start.")
+                aborted = True
             if self.verbose:
                 logger.info("Scanner trigger received, starting presentation.")
             if aborted:
@@ -268,59 +374,151 @@ class PRFStimulusPresenter:
                 self.eyetracker.send_message("EXPERIMENT_START")
 
             # --- Initialize clocks and event logs ---
+            # Precompute all frame deadlines so the loop body is a lookup
+            frame_deadlines = np.arange(self.nFrames) * self.frame_duration
+            # Evaluate the log level once: no LogRecord/f-string work per
+            # frame unless progress logging is actually enabled
+            log_progress = self.verbose and logger.isEnabledFor(logging.INFO)
+
+            # Ask the OS for elevated scheduling priority during the
+            # timing-critical section (silently downgraded if not permitted)
+            core.rush(True, realtime=True)
+
             global_clock = core.Clock()
-            frame_onsets = []
+            # key.tDown timestamps share core.getTime's timebase; subtract
+            # the reset time to express them on the run clock
+            run_t0 = global_clock.getLastResetTime()
+            # Onsets go into a preallocated float64 array (truncated on
+            # abort) so the merge below sorts on a native float key
+            frame_onsets = np.empty(self.nFrames, dtype=np.float64)
             button_events = []
-            prev_button_state = set()
             frame_idx = 0
             scan_trigger_times = []
-
-            # --- Mark stimulus onset for eyetracker ---
+            cur_stim = None  # image currently held on screen
+
+            # --- Lazy path: decode frame i+1 on a worker thread while the
+            # render thread blocks in flip(i); the gather releases the GIL,
+            # so the overlap is real. Four buffers rotate through a
+            # two-deep queue: one held by the consumer (until setImage has
+            # copied it), two queued, and one being decoded by the worker,
+            # so a slot is never overwritten while still in use.
+            prefetch_q = None
+            if self.frame_stims is None:
+                prefetch_q = queue.Queue(maxsize=2)
+                prefetch_stop = threading.Event()
+                pool = [np.empty_like(self._rgb_buf) for _ in range(4)]
+
+                def _prefetch(stop=prefetch_stop, q=prefetch_q, pool=pool):
+                    for i in range(self.nFrames):
+                        buf = pool[i % 4]
+                        lut_expand(
+                            np.asarray(self.indexed_matrix[i]), self.lut, buf
+                        )
+                        while not stop.is_set():
+                            try:
+                                q.put(buf, timeout=0.1)
+                                break
+                            except queue.Full:
+                                continue
+                        else:
+                            return
+
+                threading.Thread(target=_prefetch, daemon=True).start()
+            # All response keys are consumed in a single buffer walk per
+            # iteration; clearing on read delivers each press exactly once,
+            # so no edge detection against a previous-state set is needed
+            watched_keys = [self.abort_key, self.trigger_key] + list(button_keys)
+
+            # --- Mark stimulus onset for eyetracker (stamped at first flip) ---
             if self.eyetracker:
-                self.eyetracker.send_message("stimulus_onset")
+                self.win.callOnFlip(self.eyetracker.send_message, "stimulus_onset")
+
+            # Everything the loop body touches, bound to locals once:
+            # LOAD_FAST instead of a LOAD_ATTR dict lookup per access,
+            # thousands of times per run
+            win = self.win
+            win_flip = win.flip
+            get_flip_time = win.getFutureFlipTime
+            get_time = global_clock.getTime
+            get_keys = kb.getKeys
+            fixation = self.fixation
+            fix_update = fixation.update
+            fix_draw = fixation.draw
+            frame_stims = self.frame_stims
+            frame_map = self.frame_map
+            img_stim = self.img_stim
+            eyetracker = self.eyetracker
+            et_q = self._et_q if eyetracker else None
+            abort_key = self.abort_key
+            trigger_key = self.trigger_key
+            nFrames = self.nFrames
+            frame_duration = self.frame_duration
+            frame_log_interval = self.frame_log_interval
 
             # --- Main stimulus presentation loop ---
-            while frame_idx < self.nFrames:
-                # --- Check for abort key ---
-                if kb.getKeys(keyList=[self.abort_key], waitRelease=False):
-                    logger.info("Aborted by user during run.")
-                    aborted = True
+            while frame_idx < nFrames:
+                t = get_time()
+
+                # --- Handle abort, trigger and button keys in one query ---
+                for key in get_keys(keyList=watched_keys, waitRelease=False):
+                    name = key.name
+                    # hardware press time when the backend provides one,
+                    # otherwise the poll time
+                    t_key = key.tDown - run_t0 if key.tDown is not None else t
+                    if name == abort_key:
+                        logger.info("Aborted by user during run.")
+                        aborted = True
+                        break
+                    elif name == trigger_key:
+                        scan_trigger_times.append(t_key)
+                        if et_q is not None:
+                            # queued: sent off the render thread
+                            et_q.put("scanner_trigger")
+                    else:
+                        button_events.append((t_key, name))
+                        if et_q is not None:
+                            et_q.put(f"button_press {name}")
+                if aborted:
                     break
 
-                t = global_clock.getTime()
-
-                # --- Log scanner trigger key presses ---
-                if kb.getKeys(keyList=[self.trigger_key], waitRelease=False):
-                    scan_trigger_times.append(t)
-                    if self.eyetracker:
-                        self.eyetracker.send_message(msg="scanner_trigger")
-
-                # --- Log button presses ---
-                pressed = kb.getKeys(
-                    keyList=button_keys, waitRelease=False, clear=False
-                )
-                for key in pressed:
-                    if key.name not in prev_button_state:
-                        button_events.append((t, key.name))
-                        if self.eyetracker:
-                            self.eyetracker.send_message(msg=f"button_press {key.name}")
-                prev_button_state = set(k.name for k in pressed)
-
-                # --- Present next stimulus frame if time ---
-                if t >= (frame_idx * self.frame_duration):
-                    idx = self.indexed_matrix[frame_idx]
-                    rgb = self.lut[idx]
-                    self.img_stim.setImage(rgb)
-                    self.img_stim.draw()
-                    self.fixation.update(now=t, et=self.eyetracker)
-                    self.fixation.draw()
-                    self.win.flip()
-                    frame_onsets.append(t)
+                # --- Advance to the next frame if its deadline falls
+                # before the upcoming vblank; the flip blocks on vsync, so
+                # the loop is paced by the display, not by a 1 ms poll ---
+                t_flip = get_flip_time(clock=global_clock)
+                if t_flip >= frame_deadlines[frame_idx]:
+                    if frame_stims is not None:
+                        # draw the pre-uploaded texture for this frame
+                        cur_stim = frame_stims[frame_map[frame_idx]]
+                    else:
+                        # frames arrive decoded and in order from the worker
+                        img_stim.setImage(prefetch_q.get())
+                        cur_stim = img_stim
+                    cur_stim.draw()
+                    fix_update(now=t_flip, et=eyetracker, win=win)
+                    fix_draw()
+                    # flip() returns the measured flip time on core.getTime's
+                    # timebase; log that rather than the pre-draw prediction,
+                    # so a missed vblank shows up as a late onset
+                    t_actual = win_flip()
+                    t_onset = (
+                        t_actual - run_t0 if t_actual is not None else t_flip
+                    )
+                    frame_onsets[frame_idx] = t_onset
+                    if t_onset > frame_deadlines[frame_idx] + 0.5 * frame_duration:
+                        logger.warning(
+                            f"Frame {frame_idx} presented "
+                            f"{t_onset - frame_deadlines[frame_idx]:.3f} s late"
+                        )
                     frame_idx += 1
-                    if self.verbose and frame_idx % self.frame_log_interval == 0:
-                        logger.info(f"Presented frame {frame_idx}/{self.nFrames}")
+                    if log_progress and frame_idx % frame_log_interval == 0:
+                        logger.info(f"Presented frame {frame_idx}/{nFrames}")
                 else:
-                    core.wait(0.001)
+                    # deadline not reached: hold the current image for one
+                    # more refresh (the flip sleeps until the vblank)
+                    if cur_stim is not None:
+                        cur_stim.draw()
+                    fix_draw()
+                    win_flip()
 
             # --- Show end screen ---
             final_text = visual.TextStim(
@@ -340,25 +538,43 @@ class PRFStimulusPresenter:
                 self.eyetracker.send_message("EXPERIMENT_END")
 
             # --- Collect all events for logging ---
-            for idx, onset in enumerate(frame_onsets):
-                all_events.append((onset, "frame_onset", idx))
-            for t, color in getattr(self.fixation, "switch_log", []):
-                all_events.append((t, "fixation_color_switch", color))
-            for t, key in button_events:
-                all_events.append((t, "button_press", key))
-            for t in scan_trigger_times:
-                all_events.append((t, "scanner_trigger", f"button {self.trigger_key}"))
-            all_events.sort(key=lambda x: x[0])
+            # hoisted out of the comprehensions: one lookup / one format
+            # instead of per-row work
+            switch_log = getattr(self.fixation, "switch_log", [])
+            trig_label = f"button {self.trigger_key}"
+            all_events = [
+                (onset, FRAME_ONSET, idx)
+                for idx, onset in enumerate(frame_onsets[:frame_idx])
+            ]
+            all_events += [
+                (t, COLOR_SWITCH, color) for t, color in switch_log
+            ]
+            all_events += [(t, BUTTON_PRESS, key) for t, key in button_events]
+            all_events += [
+                (t, SCANNER_TRIGGER, trig_label) for t in scan_trigger_times
+            ]
+            # C-level argsort over the extracted float timestamps: no
+            # Python comparator runs per element
+            order = np.argsort(
+                np.fromiter(
+                    (e[0] for e in all_events),
+                    dtype=np.float64,
+                    count=len(all_events),
+                ),
+                kind="stable",
+            )
+            all_events = [all_events[i] for i in order]
 
             # --- Save behavioral log and analyze reaction times ---
-            with open(log_fpath, "w", newline="") as f:
-                writer = csv.writer(f, delimiter="\t")
-                writer.writerow(["Time", "Event", "Value"])
-                for event in all_events:
-                    writer.writerow(event)
+            # Plain f-string rows into a large buffer: the whole log leaves
+            # in one buffered pass with no per-row csv escaping machinery
+            with open(log_fpath, "w", buffering=1 << 20) as f:
+                f.write("Time\tEvent\tValue\n")
+                f.writelines(
+                    f"{t:.6f}\t{ev}\t{val}\n" for t, ev, val in all_events
+                )
 
                 # --- Reaction time analysis ---
-                switch_log = getattr(self.fixation, "switch_log", [])
                 n_hits, n_switches, mean_rt, _ = analyze_reaction_times(
                     switch_log, button_events
                 )
@@ -368,8 +584,8 @@ class PRFStimulusPresenter:
                 result2 = f"[RESULT] Mean reaction time: {mean_rt:.3f} s"
                 logger.info(result1)
                 logger.info(result2)
-                writer.writerow(["result", "", result1])
-                writer.writerow(["result", "", result2])
+                f.write(f"result\t\t{result1}\n")
+                f.write(f"result\t\t{result2}\n")
             if self.verbose:
                 logger.info(f"Saved timing log: {log_fpath}")
 
@@ -377,8 +593,15 @@ class PRFStimulusPresenter:
             logger.error(f"Exception during run: {e}")
             raise
         finally:
+            # --- Drop back to normal scheduling priority ---
+            core.rush(False)
+            # --- Stop the frame prefetcher (no-op when it ran to the end) ---
+            if prefetch_stop is not None:
+                prefetch_stop.set()
             # --- Cleanup: close window and eyetracker ---
             if self.eyetracker:
+                # Drain queued messages before the lifecycle teardown
+                self._stop_message_worker()
                 # Always try to end cleanly (even if aborted)
                 self.eyetracker.send_message("stimulus_end")
                 try:
@@ -10,15 +10,24 @@ def analyze_reaction_times(
     Returns (n_hits, n_switches, mean_rt, reaction_times).
     """
     n_switches = len(switch_log)
-    n_hits = 0
-    reaction_times = []
-    button_events_sorted = sorted(button_events, key=lambda x: x[0])
-    for switch_time, _ in switch_log:
-        for btn_time, _ in button_events_sorted:
-            dt = btn_time - switch_time
-            if min_rt <= dt <= max_rt:
-                n_hits += 1
-                reaction_times.append(dt)
-                break
-    mean_rt = np.mean(reaction_times) if reaction_times else float("nan")
-    return n_hits, n_switches, mean_rt, reaction_times
+    if n_switches == 0 or len(button_events) == 0:
+        return 0, n_switches, float("nan"), []
+
+    switch_times = np.asarray([t for t, _ in switch_log], dtype=np.float64)
+    button_times = np.asarray([t for t, _ in button_events], dtype=np.float64)
+    # The presenter appends presses in chronological order, so sorting is
+    # normally redundant; an O(B) monotonicity check guards callers that
+    # pass unordered events (hardware timestamps can reorder within a poll)
+    if np.any(np.diff(button_times) < 0):
+        button_times.sort()
+
+    # For each switch, find the first button press at least min_rt later and
+    # count a hit if it falls within max_rt (binary search, no Python loop)
+    idx = np.searchsorted(button_times, switch_times + min_rt, side="left")
+    valid = idx < len(button_times)
+    dt = button_times[idx[valid]] - switch_times[valid]
+    reaction_times = dt[dt <= max_rt]
+
+    n_hits = len(reaction_times)
+    mean_rt = reaction_times.mean() if n_hits else float("nan")
+    return n_hits, n_switches, mean_rt, reaction_times.tolist()